@@ -11,6 +11,8 @@ from cups import Connection as CupsConnection
 from serial import Serial, SerialException
 from serial.tools.list_ports import comports
 
+import bojata_shm as shm
+
 
 logging.basicConfig(format='[%(levelname)s] %(asctime)s - %(message)s',
                     level=os.getenv('LOGLEVEL', 'INFO').upper())
@@ -42,7 +44,6 @@ serial:     Serial
 cups:       CupsConnection | None
 frame:      tk.Frame | tk.Tk
 canvas:     tk.Canvas
-curr_color: str | None
 
 # Canvas item IDs
 _color_rect:    int
@@ -89,18 +90,29 @@ def task():
         if getattr(frame, 'is_visible', True) and (m := RGB_PATTERN.match(line)):
             r, g, b, i, pf = m.groups()
             r, g, b = map(int, (r, g, b))
+            i = int(i) if i is not None else None
+            raw = (r, g, b, i)
 
             # If ambient light intensity is present, adjust color accordingly
             if i is not None:
-                total = int(i) or 1
+                total = i or 1
                 r = int(r / total * 255)
                 g = int(g / total * 255)
                 b = int(b / total * 255)
+            # Channels can overshoot if a reading exceeds the intensity (or it's 0)
+            r, g, b = (min(c, 255) for c in (r, g, b))
 
-            # Draw colored area
-            global curr_color
+            # Publish the sample for other readers (GUI, LCD thread, etc.)
             curr_color = f'#{r:02x}{g:02x}{b:02x}'
+            try:
+                shm.publish(*raw, curr_color)
+            except ValueError as e:
+                logging.warning("Discarding invalid RGB message %r (%s)", line, e)
+                frame.after(TASK_DELAY, task)
+                return
             logging.debug("curr_color: %s", curr_color)
+
+            # Draw colored area
             canvas.itemconfig(_color_rect, fill=curr_color)
 
             # If print flag is present, start printing the color
@@ -204,8 +216,12 @@ def init(*, init_serial: Serial = None, init_cups: CupsConnection = None,
     _status_text = canvas.create_text(cx, cy, text="",
                                       justify=tk.CENTER, fill='white')
 
-    global curr_color
-    curr_color = None
+    try:
+        shm.init()
+    except FileExistsError as e:
+        # Another instance publishes under the shared name (see SHM_NAME)
+        logging.warning("%s; using a private block instead", e)
+        shm.init(private=True)
 
     frame.after(TASK_DELAY, task)  # Schedule first task
 
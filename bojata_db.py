@@ -88,6 +88,9 @@ class Color(Base, metaclass=LabelsMeta):
 def init():
     global engine
     engine = create_engine(DB_URL, echo=True)
+
+
+def create_tables():
     Base.metadata.create_all(engine)
 
 
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import logging
 import os
 import textwrap
 import tkinter as tk
@@ -12,6 +13,8 @@ from PIL import Image, ImageDraw, ImageFont
 
 import bojata
 import bojata_db as db
+import bojata_journal as journal
+import bojata_shm as shm
 if bojata.LCD_ENABLED:
     import bojata_lcd as lcd
 
@@ -21,6 +24,7 @@ PRINT_TEMPLATE = 'print/template_rev0.7.png'
 
 DEFAULT_LOCATION = "Studio Galić, Split"
 DRAWER_COUNT = 10
+SCAN_WINDOW = 1.0  # Seconds of recent samples whose median is taken as the scanned color
 
 
 class BojataRoot(tk.Tk):
@@ -108,7 +112,7 @@ class HomeFrame(BojataFrame):
 class ScanFrame(BojataFrame):
     def on_show_frame(self, event):
         self.reinit_ui()
-        self.scanned_color = bojata.curr_color
+        self.scanned_color = shm.median_color(SCAN_WINDOW)
         self.color_swatch.config(bg=self.scanned_color)
         self.iv['hex'].set(self.scanned_color)
         super().on_show_frame(event)
@@ -214,9 +218,12 @@ class ScanFrame(BojataFrame):
                 e.config(bg='pink')
             return
 
-        # TODO: Add exception handling
-        color = db.Color(**input_values)
-        db.persist(color)
+        try:
+            journal.append(input_values)  # Flushed to the database in the background
+        except OSError as e:
+            logging.exception("Failed to save color")
+            tk.messagebox.showerror(None, f"Greška pri čuvanju boje: {e.strerror or e}")
+            return
         self.print_prompt()
 
         self.root.show_frame('HomeFrame')
@@ -227,11 +234,11 @@ class ScanFrame(BojataFrame):
     def print_prompt(self):
         # TODO: Replace with a custom dialog window
         if not bojata.PRINT_ENABLED:
-            tk.messagebox.showinfo(None, "Boja sačuvana u bazu.")
+            tk.messagebox.showinfo(None, "Boja zabeležena.")
             return
 
         if tk.messagebox.askyesno(
-            None, "Boja sačuvana u bazu. Da li želite ištampati priznanicu?",
+            None, "Boja zabeležena. Da li želite ištampati priznanicu?",
         ):
             # TODO: Enqueue for print task instead
             bojata.start_printing(self.scanned_color, self.generate_image())
@@ -312,6 +319,7 @@ def main():
 
     bojata.init(init_frame=home_frame.color_frame)
     db.init()
+    journal.init()  # Creates the tables in the background
     if bojata.LCD_ENABLED:
         lcd.init()
 
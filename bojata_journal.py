@@ -0,0 +1,219 @@
+import errno
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+from sqlalchemy.orm import Session
+
+import bojata_db as db
+
+
+JOURNAL_FILENAME = 'data/journal.jsonl'
+REJECTED_FILENAME = 'data/journal.jsonl.rejected'  # Dead letters, kept for recovery
+FLUSH_BATCH_SIZE = 50
+RETRY_DELAY = 1000       # Doubled after each failed attempt...
+RETRY_DELAY_MAX = 60000  # ...up to this limit
+
+# Globals
+thread:   threading.Thread
+_lock   = threading.Lock()       # Guards the journal file and _pending
+_wakeup = threading.Event()
+_pending: dict[str, dict] = {}  # Entry ID → Color column values (in submission order)
+_replayed: set[str] = set()     # IDs of entries loaded from a previous run
+
+
+def append(values: dict) -> str:
+    """Record a color submission in the journal and schedule it for flushing.
+
+    Returns as soon as the entry is durably written to the journal, without
+    waiting on the database.
+    """
+    entry_id = uuid.uuid4().hex
+    with _lock:
+        _write({'id': entry_id, 'values': values})
+        _pending[entry_id] = values
+    _wakeup.set()
+    logging.debug("[Journal] Appended entry %s", entry_id)
+    return entry_id
+
+
+def pending_count():
+    with _lock:
+        return len(_pending)
+
+
+def _write(record, filename=JOURNAL_FILENAME):
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf8')
+    fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        size = os.fstat(fd).st_size
+        try:
+            if os.write(fd, line) != len(line):
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), filename)
+            os.fsync(fd)
+        except OSError:
+            # Don't leave a partial line for the next record to be appended to
+            os.ftruncate(fd, size)
+            raise
+    finally:
+        os.close(fd)
+
+
+def _compact():
+    """Rewrite the journal so that it contains only the pending entries."""
+    tmp_filename = JOURNAL_FILENAME + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf8') as f:
+        for entry_id, values in _pending.items():
+            f.write(json.dumps({'id': entry_id, 'values': values}, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, JOURNAL_FILENAME)
+
+
+def _replay():
+    """Load entries that were not yet flushed when the journal was last used."""
+    if not os.path.exists(JOURNAL_FILENAME):
+        return
+
+    with open(JOURNAL_FILENAME, encoding='utf8') as f:
+        for lineno, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Most likely a partial write interrupted by a power loss
+                logging.warning("[Journal] Skipping malformed line %d: %r", lineno, line)
+                continue
+            if not isinstance(record, dict):
+                logging.warning("[Journal] Skipping malformed line %d: %r", lineno, line)
+            elif 'done' in record:
+                for entry_id in record['done']:
+                    _pending.pop(entry_id, None)
+            elif 'id' in record and 'values' in record:
+                _pending[record['id']] = record['values']
+            else:
+                logging.warning("[Journal] Skipping malformed line %d: %r", lineno, line)
+
+    _replayed.update(_pending)
+    _compact()
+    if _pending:
+        logging.info("[Journal] Replaying %d pending entries", len(_pending))
+
+
+def _is_duplicate(session, color, values):
+    """Check whether an identical color was already stored (e.g. if the
+    process died between committing a batch and marking it as done).
+    """
+    stmt = select(db.Color.id).filter_by(
+        **{c: getattr(color, c) for c in values}
+    ).limit(1)
+    return session.scalar(stmt) is not None
+
+
+def _persist(batch):
+    with Session(db.engine) as session:
+        for entry_id, values in batch:
+            color = db.Color(**values)
+            # Only entries from a previous run may have been stored already
+            if entry_id in _replayed and _is_duplicate(session, color, values):
+                logging.info("[Journal] Entry %s already in database, skipping", entry_id)
+                continue
+            session.add(color)
+        session.commit()
+
+
+def _is_entry_error(e):
+    """Check whether a flush failed because of the entry itself (as opposed to
+    the database being unavailable, corrupt, etc.).
+    """
+    if isinstance(e, (IntegrityError, DataError)):
+        return True
+    if isinstance(e, DBAPIError):
+        return False
+    # Raised while constructing the Color or binding its parameters
+    return isinstance(e, (StatementError, ValueError, TypeError, LookupError))
+
+
+def _reject(entry_id, values, error):
+    logging.error("[Journal] Rejected entry %s: %r (%s)", entry_id, values, error)
+    _write({'id': entry_id, 'values': values, 'error': str(error)},
+           filename=REJECTED_FILENAME)
+
+
+def _mark_done(batch):
+    with _lock:
+        for entry_id, _ in batch:
+            _pending.pop(entry_id, None)
+            _replayed.discard(entry_id)
+        if _pending:
+            _write({'done': [entry_id for entry_id, _ in batch]})
+            _wakeup.set()
+        else:
+            _compact()
+
+
+def flush_journal():
+    """Persist pending entries to the database in batches, retrying on failure.
+
+    Entries that can never be stored are moved to the rejected journal; any
+    other failure is retried with exponential backoff. The tables are created
+    here as well, so that an unavailable database never blocks startup.
+    """
+    delay = RETRY_DELAY
+    batch_size = FLUSH_BATCH_SIZE
+    tables_created = False
+
+    while True:
+        _wakeup.wait()
+        with _lock:
+            _wakeup.clear()
+            batch = list(_pending.items())[:batch_size]
+
+        try:
+            if not tables_created:
+                db.create_tables()
+                tables_created = True
+            if not batch:
+                continue
+            try:
+                _persist(batch)
+            except Exception as e:
+                if not _is_entry_error(e):
+                    raise
+                if len(batch) > 1:
+                    # Find the offending entry by flushing one at a time
+                    batch_size = 1
+                    _wakeup.set()
+                    continue
+                _reject(*batch[0], e)
+            _mark_done(batch)
+        except DBAPIError as e:
+            # Database is locked, corrupt or unreachable
+            logging.warning("[Journal] Flush failed (%s)! Retrying in %g s...",
+                            e.orig, delay / 1000)
+        except Exception:
+            logging.exception("[Journal] Flush failed! Retrying in %g s...",
+                              delay / 1000)
+        else:
+            logging.debug("[Journal] Flushed %d entries", len(batch))
+            delay = RETRY_DELAY
+            batch_size = FLUSH_BATCH_SIZE
+            continue
+
+        time.sleep(delay / 1000)
+        delay = min(delay * 2, RETRY_DELAY_MAX)
+        _wakeup.set()
+
+
+def init():
+    global thread
+    with _lock:
+        _replay()
+    thread = threading.Thread(target=flush_journal, daemon=True)
+    thread.start()
+    _wakeup.set()
+    logging.debug("[Journal] Started journal flushing thread")
@@ -6,6 +6,7 @@ import time
 from PIL import Image, ImageDraw
 
 import bojata
+import bojata_shm as shm
 from bojata import logging
 
 
@@ -23,7 +24,7 @@ def render_color_frame():
     while True:
         time.sleep(bojata.LCD_DELAY / 1000)
 
-        color = bojata.curr_color  # Race condition?
+        color = shm.latest_color()
         if color is None:
             continue
 
@@ -0,0 +1,229 @@
+# Latest color samples, shared between threads and processes.
+#
+# A single writer publishes samples into a ring in a shared memory block;
+# readers take lock-free snapshots guarded by a sequence counter (seqlock).
+# Python issues no memory barriers, so on weakly ordered CPUs (e.g. the RPi's
+# ARM cores) a reader in another process may observe the writes out of order.
+# Each sample therefore carries its index and a CRC32, and readers retry on
+# any mismatch instead of relying on the sequence counter alone.
+import atexit
+import logging
+import os
+import statistics
+import struct
+import time
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple
+
+
+SHM_NAME = os.getenv('SHM_NAME', 'bojata')
+RING_SIZE = 64       # Number of recent samples kept
+READ_RETRIES = 1000  # Give up on a snapshot after this many torn reads
+
+# Header: sequence counter (odd while a write is in progress), total samples written, owner PID
+HEADER = struct.Struct('<QQQ')
+# Sample: index, timestamp, raw R, G, B, I (-1 if absent), normalized hex...
+SAMPLE_DATA = struct.Struct('<QdIIIi7s')
+# ...followed by the CRC32 of the above
+SAMPLE = struct.Struct(SAMPLE_DATA.format + 'I')
+SHM_SIZE = HEADER.size + RING_SIZE * SAMPLE.size
+
+# Globals
+shm:      shared_memory.SharedMemory | None = None
+is_owner: bool = False
+
+
+class Sample(NamedTuple):
+    timestamp: float
+    r:         int
+    g:         int
+    b:         int
+    i:         int | None
+    hex:       str
+
+    @classmethod
+    def unpack(cls, buf, index):
+        offset = _sample_offset(index)
+        raw = bytes(buf[offset:offset+SAMPLE.size])
+        idx, ts, r, g, b, i, hex_, crc = SAMPLE.unpack(raw)
+        if idx != index or zlib.crc32(raw[:SAMPLE_DATA.size]) != crc:
+            raise _TornRead
+        return cls(ts, r, g, b, None if i < 0 else i, hex_.decode('ascii'))
+
+
+class _TornRead(Exception):
+    pass
+
+
+def _sample_offset(index):
+    return HEADER.size + (index % RING_SIZE) * SAMPLE.size
+
+
+def publish(r, g, b, i, hex_):
+    """Append a sample to the ring and make it the latest value.
+
+    Only the owning process may write. Readers are never blocked; they retry
+    if they observe a write in progress (seqlock).
+    """
+    if len(hex_) != 7:
+        raise ValueError(f"Invalid hex color: {hex_!r}")
+
+    buf = shm.buf
+    seq, count, pid = HEADER.unpack_from(buf, 0)
+    # Pack before touching the header, so that invalid values can't leave a
+    # write in progress forever
+    try:
+        data = SAMPLE_DATA.pack(count, time.time(), r, g, b, -1 if i is None else i,
+                                hex_.encode('ascii'))
+    except struct.error as e:
+        raise ValueError(f"Invalid sample: {e}") from e
+    sample = data + struct.pack('<I', zlib.crc32(data))
+
+    offset = _sample_offset(count)
+    HEADER.pack_into(buf, 0, seq + 1, count, pid)  # Odd: write in progress
+    buf[offset:offset+SAMPLE.size] = sample
+    HEADER.pack_into(buf, 0, seq + 2, count + 1, pid)
+
+
+def _read(read_fn, default):
+    """Run `read_fn(buf, count)` until it sees a consistent snapshot.
+
+    Returns `default` if no consistent snapshot could be taken (e.g. if the
+    writer died mid-write).
+    """
+    buf = shm.buf
+    for _ in range(READ_RETRIES):
+        seq1, count, _ = HEADER.unpack_from(buf, 0)
+        if not seq1 & 1:
+            try:
+                result = read_fn(buf, count)
+            except _TornRead:
+                continue
+            seq2, _, _ = HEADER.unpack_from(buf, 0)
+            if seq1 == seq2:
+                return result
+        time.sleep(0)  # Yield to the writer
+    logging.warning("[SHM] No consistent snapshot after %d retries", READ_RETRIES)
+    return default
+
+
+def latest() -> Sample | None:
+    """Return the most recent sample, or None if nothing was published yet."""
+    if shm is None:
+        return None
+    return _read(lambda buf, count:
+                 Sample.unpack(buf, count - 1) if count else None,
+                 default=None)
+
+
+def latest_color() -> str | None:
+    sample = latest()
+    return sample.hex if sample is not None else None
+
+
+def history(n=RING_SIZE) -> list[Sample]:
+    """Return up to `n` most recent samples, oldest first."""
+    if shm is None:
+        return []
+
+    def read_fn(buf, count):
+        start = max(count - min(n, RING_SIZE), 0)
+        return [Sample.unpack(buf, k) for k in range(start, count)]
+
+    return _read(read_fn, default=[])
+
+
+def median_color(window) -> str | None:
+    """Return the per-channel median of the samples published within `window`
+    seconds of the latest one, or None if nothing was published yet.
+    """
+    samples = history()
+    if not samples:
+        return None
+    since = samples[-1].timestamp - window
+    colors = [s.hex for s in samples if s.timestamp >= since]
+    r, g, b = (statistics.median_low(int(c[k:k+2], 16) for c in colors)
+               for k in (1, 3, 5))
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def _attach():
+    block = shared_memory.SharedMemory(SHM_NAME)
+    # Non-owners must not unlink the block when they exit
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+def _is_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, but belongs to another user
+    return True
+
+
+def _unlink_if_stale():
+    """Remove an existing block if the process that created it is gone."""
+    block = shared_memory.SharedMemory(SHM_NAME)
+    owner_pid = 0
+    if block.size >= HEADER.size:
+        _, _, owner_pid = HEADER.unpack_from(block.buf, 0)
+    block.close()
+
+    if _is_alive(owner_pid):
+        resource_tracker.unregister(block._name, 'shared_memory')
+        raise FileExistsError(
+            f"Shared memory block {SHM_NAME!r} is in use by process {owner_pid}"
+        )
+    logging.warning("[SHM] Replacing stale shared memory block %r (owner PID %d)",
+                    SHM_NAME, owner_pid)
+    block.unlink()
+
+
+def init(*, create=True, private=False):
+    """Create (or, if `create` is false, attach to) the shared memory block.
+
+    The creating process owns the block and unlinks it on exit. Other
+    processes may attach to it in order to read samples. Creating fails with
+    FileExistsError if the block is owned by another live process, unless
+    `private` is true, in which case an anonymously named block is created.
+    """
+    global shm, is_owner
+    if private:
+        shm = shared_memory.SharedMemory(create=True, size=SHM_SIZE)
+        HEADER.pack_into(shm.buf, 0, 0, 0, os.getpid())
+        is_owner = True
+    elif create:
+        try:
+            shm = shared_memory.SharedMemory(SHM_NAME, create=True, size=SHM_SIZE)
+        except FileExistsError:
+            _unlink_if_stale()
+            shm = shared_memory.SharedMemory(SHM_NAME, create=True, size=SHM_SIZE)
+        HEADER.pack_into(shm.buf, 0, 0, 0, os.getpid())
+        is_owner = True
+    else:
+        shm = _attach()
+        is_owner = False
+
+    atexit.register(close)
+    logging.debug("[SHM] %s shared memory block %r (%d bytes)",
+                  "Created" if create else "Attached to", shm.name, SHM_SIZE)
+
+
+def close():
+    global shm
+    if shm is None:
+        return
+    shm.close()
+    if is_owner:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            # Already gone; make sure the resource tracker doesn't retry either
+            resource_tracker.unregister(shm._name, 'shared_memory')
+    shm = None